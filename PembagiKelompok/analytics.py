@@ -0,0 +1,350 @@
+import argparse
+import ast
+import csv
+import json
+import os
+import sys
+from itertools import chain, islice
+
+import numpy as np
+
+from storage import DATABASE_PATH, GroupStorage
+
+CHUNK_SIZE = 4096
+# Above this (students / largest group)^2 ratio, counting padded in-group
+# pairs with bincount beats the dense one-hot matrix product.
+SPARSE_RATIO = 400
+TOP_PAIRS = 10
+
+
+class CooccurrenceResult:
+    """Pair co-occurrence counts and group size statistics over one source"""
+
+    def __init__(self, names, counts, num_combinations, size_counts):
+        self.names = names
+        self.counts = counts
+        self.num_combinations = num_combinations
+        self.size_counts = size_counts
+
+    def rates(self):
+        if not self.num_combinations:
+            return np.zeros_like(self.counts, dtype=np.float64)
+        return self.counts / self.num_combinations
+
+    def pairs(self):
+        """Return (i, j, count) arrays for every unordered pair of students"""
+        i, j = np.triu_indices(len(self.names), k=1)
+        return i, j, self.counts[i, j]
+
+    def top_pairs(self, k=TOP_PAIRS, most=True):
+        i, j, pair_counts = self.pairs()
+        order = np.argsort(pair_counts, kind='stable')
+        if most:
+            order = order[::-1]
+        return [
+            (self.names[i[p]], self.names[j[p]], int(pair_counts[p]))
+            for p in order[:k]
+        ]
+
+    def always_together(self):
+        if not self.num_combinations:
+            return []
+        i, j, pair_counts = self.pairs()
+        together = np.flatnonzero(pair_counts == self.num_combinations)
+        return [(self.names[i[p]], self.names[j[p]]) for p in together]
+
+    def summary(self):
+        n = len(self.names)
+        sizes = np.arange(len(self.size_counts))
+        num_groups = int(self.size_counts.sum())
+        _, _, pair_counts = self.pairs()
+        pair_rates = pair_counts / self.num_combinations if self.num_combinations else pair_counts.astype(float)
+
+        summary = {
+            'num_students': n,
+            'num_combinations': self.num_combinations,
+            'group_sizes': {
+                str(size): int(count) for size, count in zip(sizes, self.size_counts) if count
+            },
+        }
+        if num_groups:
+            mean_size = float((sizes * self.size_counts).sum() / num_groups)
+            summary['group_size_mean'] = mean_size
+            summary['group_size_std'] = float(
+                np.sqrt((self.size_counts * (sizes - mean_size) ** 2).sum() / num_groups)
+            )
+            summary['group_size_min'] = int(sizes[self.size_counts > 0].min())
+            summary['group_size_max'] = int(sizes[self.size_counts > 0].max())
+        if len(pair_rates):
+            summary['pair_rate_mean'] = float(pair_rates.mean())
+            summary['pair_rate_std'] = float(pair_rates.std())
+            summary['pair_rate_min'] = float(pair_rates.min())
+            summary['pair_rate_max'] = float(pair_rates.max())
+        summary['most_together'] = self.top_pairs(most=True)
+        summary['least_together'] = self.top_pairs(most=False)
+        summary['always_together'] = self.always_together()
+        return summary
+
+    def export(self, prefix):
+        """Write ``<prefix>_matrix.csv`` and ``<prefix>_summary.json``"""
+        matrix_path = f"{prefix}_matrix.csv"
+        summary_path = f"{prefix}_summary.json"
+        with open(matrix_path, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow([''] + list(self.names))
+            for name, row in zip(self.names, self.counts.tolist()):
+                writer.writerow([name] + row)
+        with open(summary_path, mode='w', encoding='utf-8') as file:
+            json.dump(self.summary(), file, indent=2, ensure_ascii=False)
+        return matrix_path, summary_path
+
+
+def chunk_arrays(chunk):
+    """Flatten combinations (lists of groups of student positions) into
+    (num_combinations, sizes, members) arrays"""
+    sizes = np.fromiter((len(group) for groups in chunk for group in groups), dtype=np.intp)
+    members = np.fromiter(chain.from_iterable(chain.from_iterable(chunk)), dtype=np.intp, count=sizes.sum())
+    return len(chunk), sizes, members
+
+
+def decode_json_chunk(rows):
+    """Decode stored JSON combinations without building Python lists.
+
+    Each group's closing bracket becomes a -1 marker, so the whole chunk
+    is parsed by NumPy in one call. Groups are never empty.
+    """
+    text = ','.join(rows).replace('[', '').replace(']]', ',-1').replace(']', ',-1')
+    tokens = np.fromstring(text, dtype=np.intp, sep=',')
+    ends = np.flatnonzero(tokens < 0)
+    sizes = np.diff(ends, prepend=-1) - 1
+    return len(rows), sizes, tokens[tokens >= 0]
+
+
+def accumulate(counts, size_counts, sizes, members):
+    """Add one chunk of groups to the co-occurrence and group size totals"""
+    n = counts.shape[0]
+    if not len(sizes):
+        return
+    group_ids = np.repeat(np.arange(len(sizes)), sizes)
+    size_counts += np.bincount(sizes, minlength=len(size_counts))
+
+    largest = int(sizes.max())
+    if largest * largest * SPARSE_RATIO < n * n:
+        # Many small groups: pad every group to the largest size with a
+        # sentinel student n and count all in-group pairs at once.
+        starts = np.cumsum(sizes) - sizes
+        padded = np.full((len(sizes), largest), n, dtype=np.intp)
+        padded[group_ids, np.arange(len(members)) - starts[group_ids]] = members
+        pair_index = padded[:, :, None] * (n + 1) + padded[:, None, :]
+        pair_counts = np.bincount(pair_index.ravel(), minlength=(n + 1) * (n + 1))
+        counts += pair_counts.reshape(n + 1, n + 1)[:n, :n]
+    else:
+        # Few large groups: one-hot membership matrix, counts += M^T M.
+        # float32 is exact here since a chunk never exceeds 2^24 rows.
+        membership = np.zeros((len(sizes), n), dtype=np.float32)
+        membership[group_ids, members] = 1
+        counts += (membership.T @ membership).astype(np.int64)
+
+
+def analyze(names, chunks, progress=None):
+    """Accumulate the co-occurrence matrix over a stream of chunks.
+
+    ``chunks`` yields (num_combinations, sizes, members) arrays as built by
+    chunk_arrays or decode_json_chunk, so only one chunk is held in memory
+    at a time. ``progress`` is called with the number of combinations
+    processed after each chunk.
+    """
+    n = len(names)
+    counts = np.zeros((n, n), dtype=np.int64)
+    size_counts = np.zeros(n + 1, dtype=np.int64)
+    num_combinations = 0
+
+    for chunk_rows, sizes, members in chunks:
+        accumulate(counts, size_counts, sizes, members)
+        num_combinations += chunk_rows
+        if progress:
+            progress(num_combinations)
+
+    return CooccurrenceResult(names, counts, num_combinations, size_counts)
+
+
+def lookup_names(data, starts, stops, roster):
+    """Map raw UTF-8 name spans to positions in ``roster``.
+
+    ``roster`` is the sorted roster as a fixed-width bytes array. Every
+    span is gathered into the same dtype and found with searchsorted, then
+    compared for equality, so the lookup is exact.
+    """
+    width = roster.dtype.itemsize
+    lengths = stops - starts
+    if not len(lengths):
+        return np.empty(0, dtype=np.intp)
+    padded = np.concatenate([data, np.zeros(width, dtype=np.uint8)])
+    offsets = np.arange(width)
+    spans = np.where(offsets < lengths[:, None], padded[starts[:, None] + offsets], np.uint8(0))
+    keys = spans.view(roster.dtype).ravel()
+    positions = np.minimum(np.searchsorted(roster, keys), len(roster) - 1)
+    valid = (roster[positions] == keys) & (lengths <= width)
+    if not valid.all():
+        bad = np.flatnonzero(~valid)[0]
+        name = bytes(data[starts[bad]:stops[bad]]).decode('utf-8', errors='replace')
+        raise ValueError(f"Unknown student {name!r} (not in the first row)")
+    return positions
+
+
+def decode_csv_chunk(data, roster, first_row=1):
+    """Decode raw combinations CSV lines without parsing Python literals.
+
+    Only valid for rosters whose names need no quoting or escaping in
+    repr() (see plain_name): every name is then a single-quoted span, a
+    group ends where a closing quote is followed by ']', and a ']' right
+    after another ']' closes the row. ``first_row`` numbers the chunk's
+    first row in error messages.
+    """
+    data = np.frombuffer(data, dtype=np.uint8)
+    quotes = np.flatnonzero(data == ord("'"))
+    closes = np.flatnonzero(data == ord(']'))
+    if (len(quotes) % 2 or (len(closes) and closes[0] == 0)
+            or (len(quotes) and quotes[-1] + 1 >= len(data))):
+        raise ValueError("Combinations file is truncated/malformed")
+    row_closes = closes[data[closes - 1] == ord(']')]
+    starts = quotes[0::2] + 1
+    stops = quotes[1::2]
+    last_in_group = np.flatnonzero(data[stops + 1] == ord(']'))
+    if len(last_in_group) != len(closes) - len(row_closes):
+        raise ValueError("Combinations file has an empty group")
+    rows = np.searchsorted(row_closes, stops)
+    if len(stops) and (rows[-1] == len(row_closes) or last_in_group[-1] != len(stops) - 1):
+        raise ValueError("Combinations file is truncated/malformed")
+
+    sizes = np.diff(last_in_group, prepend=-1)
+    members = lookup_names(data, starts, stops, roster)
+    n = len(roster)
+    repeated = np.flatnonzero(np.bincount(rows * n + members, minlength=len(row_closes) * n) > 1)
+    if len(repeated):
+        raise ValueError(f"Row {first_row + repeated[0] // n} lists a student more than once")
+    return len(row_closes), sizes, members
+
+
+def plain_name(name):
+    return bool(name) and name.isprintable() and not any(char in name for char in "'\"\\[]")
+
+
+def read_csv_source(file_path, chunk_size=CHUNK_SIZE):
+    """Return (names, chunks) for a combinations CSV file.
+
+    The roster is the sorted students of the first row, and the file is
+    read lazily. Rosters of plain names are decoded in bulk with NumPy;
+    anything else falls back to ast.literal_eval per row.
+    """
+    with open(file_path, mode='r', encoding='utf-8') as file:
+        first = next((row for row in csv.reader(file) if row), None)
+    if first is None:
+        raise ValueError("Combinations file is empty")
+    names = sorted(student for group in ast.literal_eval(first[0]) for student in group)
+    for previous, student in zip(names, names[1:]):
+        if previous == student:
+            raise ValueError(f"Student {student!r} appears more than once in row 1")
+
+    if all(plain_name(name) for name in names):
+        # UTF-8 keeps code point order, so the encoded roster stays sorted
+        roster = np.array([name.encode('utf-8') for name in names])
+        return names, _fast_csv_chunks(file_path, roster, chunk_size)
+    return names, _literal_csv_chunks(file_path, names, chunk_size)
+
+
+def _fast_csv_chunks(file_path, roster, chunk_size):
+    # Read blocks of roughly chunk_size rows and cut them at the last newline
+    with open(file_path, mode='rb') as file:
+        block_size = max(len(file.readline()), 1) * chunk_size
+        file.seek(0)
+        rest = b''
+        row = 1
+        while True:
+            block = file.read(block_size)
+            if not block:
+                if rest.strip():
+                    yield decode_csv_chunk(rest, roster, row)
+                break
+            data = rest + block
+            cut = data.rfind(b'\n') + 1
+            rest = data[cut:]
+            if cut:
+                chunk = decode_csv_chunk(memoryview(data)[:cut], roster, row)
+                row += chunk[0]
+                yield chunk
+
+
+def _literal_csv_chunks(file_path, names, chunk_size):
+    positions = {student: position for position, student in enumerate(names)}
+
+    def encode(row_number, groups):
+        if not all(groups):
+            raise ValueError("Combinations file has an empty group")
+        try:
+            encoded = [[positions[student] for student in group] for group in groups]
+        except KeyError as e:
+            raise ValueError(f"Unknown student {e.args[0]!r} (not in the first row)") from None
+        members = list(chain.from_iterable(encoded))
+        if len(set(members)) != len(members):
+            raise ValueError(f"Row {row_number} lists a student more than once")
+        return encoded
+
+    with open(file_path, mode='r', encoding='utf-8') as file:
+        rows = enumerate((ast.literal_eval(row[0]) for row in csv.reader(file) if row), 1)
+        while True:
+            chunk = [encode(row_number, groups) for row_number, groups in islice(rows, chunk_size)]
+            if not chunk:
+                break
+            yield chunk_arrays(chunk)
+
+
+def read_run_source(storage, run_id, chunk_size=CHUNK_SIZE):
+    """Return (names, chunks) for a run stored in the database"""
+    run = storage.get_run(run_id)
+    if run is None:
+        raise ValueError(f"Run {run_id} not found")
+    chunks = (decode_json_chunk(rows) for rows in storage.iter_raw_combinations(run_id, chunk_size))
+    return storage.get_roster(run[1]), chunks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Pair co-occurrence analytics over a combinations file or stored run"
+    )
+    parser.add_argument('source', nargs='?', help="combinations CSV file")
+    parser.add_argument('--run', type=int, help="analyze a run from the database instead of a CSV file")
+    parser.add_argument('--database', default=DATABASE_PATH, help="database path (default: %(default)s)")
+    parser.add_argument('--output', help="output prefix (default: derived from the source)")
+    args = parser.parse_args(argv)
+
+    if args.run is None and not args.source:
+        parser.error("either a CSV file or --run is required")
+
+    storage = None
+    try:
+        if args.run is not None:
+            storage = GroupStorage(args.database)
+            names, chunks = read_run_source(storage, args.run)
+            prefix = args.output or f"run_{args.run}"
+        else:
+            names, chunks = read_csv_source(args.source)
+            prefix = args.output or os.path.splitext(args.source)[0]
+        result = analyze(names, chunks)
+    finally:
+        if storage:
+            storage.close()
+
+    matrix_path, summary_path = result.export(prefix)
+    summary = result.summary()
+    print(f"Analyzed {summary['num_combinations']} combinations of {summary['num_students']} students")
+    if 'pair_rate_mean' in summary:
+        print(f"Pair rate: mean {summary['pair_rate_mean']:.4f}, "
+              f"min {summary['pair_rate_min']:.4f}, max {summary['pair_rate_max']:.4f}")
+    print(f"Matrix: {matrix_path}")
+    print(f"Summary: {summary_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
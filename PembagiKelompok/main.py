@@ -1,7 +1,12 @@
 from PyQt5.QtWidgets import *
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QColor, QFont
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QFont, QTextDocument
+from storage import GroupStorage
+from analytics import analyze, read_csv_source, read_run_source
+from collections import OrderedDict
+import ast
 import csv
+import html
 import os
 import random
 import math
@@ -19,6 +24,99 @@ COLORS = {
     'text': '#1e293b',         
 }
 
+RENDER_CACHE_SIZE = 64
+PREFETCH_DISTANCE = 2
+
+GROUP_VIEW_STYLE = """
+    <style>
+        .group-header {
+            color: """ + COLORS['primary'] + """;
+            font-size: 16px;
+            font-weight: bold;
+            margin: 12px 0 8px 0;
+        }
+        .student-item {
+            margin: 4px 0;
+            padding: 4px 0 4px 20px;
+            color: """ + COLORS['text'] + """;
+        }
+    </style>
+"""
+
+def render_groups_html(groups):
+    """Build the whole group view document in a single pass"""
+    parts = [GROUP_VIEW_STYLE]
+    for group_num, group in enumerate(groups, 1):
+        parts.append(f'<div class="group-header">Group {group_num}</div>')
+        parts.extend(f'<div class="student-item">• {html.escape(student)}</div>' for student in group)
+        parts.append('<br>')
+    return ''.join(parts)
+
+class RenderCache:
+    """LRU cache of laid-out group documents, keyed by (run id, row).
+
+    Documents are built and prefetched on the GUI thread while the app is
+    idle; keys include the run id, so the cache survives switching runs.
+    """
+    def __init__(self, max_size=RENDER_CACHE_SIZE):
+        self.max_size = max_size
+        self.items = OrderedDict()
+
+    def get(self, key):
+        if key not in self.items:
+            return None
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self.items
+
+class AnalysisCancelled(Exception):
+    pass
+
+class AnalysisWorker(QThread):
+    """Runs co-occurrence analytics off the GUI thread"""
+    progress = pyqtSignal(int)
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, file_path=None, run_id=None, database_path=None, parent=None):
+        super().__init__(parent)
+        self.file_path = file_path
+        self.run_id = run_id
+        self.database_path = database_path
+
+    def run(self):
+        storage = None
+        try:
+            if self.run_id is not None:
+                # SQLite connections cannot cross threads, so open our own
+                storage = GroupStorage(self.database_path)
+                names, chunks = read_run_source(storage, self.run_id)
+            else:
+                names, chunks = read_csv_source(self.file_path)
+            result = analyze(names, chunks, progress=self.report_progress)
+        except AnalysisCancelled:
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        finally:
+            if storage:
+                storage.close()
+        self.done.emit(result)
+
+    def report_progress(self, count):
+        if self.isInterruptionRequested():
+            raise AnalysisCancelled()
+        self.progress.emit(count)
+
 class StyledButton(QPushButton):
     def __init__(self, text, color=COLORS['primary'], parent=None):
         super().__init__(text, parent)
@@ -116,7 +214,17 @@ class ModernGroupDividerApp(QMainWindow):
         """)
         
         self.students = []
-        self.current_combination_file = None
+        self.current_run_id = None
+        self.storage = GroupStorage()
+        self.render_cache = RenderCache()
+        self.displayed_document = None
+        self.prefetch_queue = []
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(0)
+        self.prefetch_timer.timeout.connect(self.prefetch_next)
+        self.analysis_result = None
+        self.analysis_worker = None
         
         self.setup_ui()
         
@@ -149,14 +257,17 @@ class ModernGroupDividerApp(QMainWindow):
         student_tab = self.create_student_tab()
         groups_tab = self.create_groups_tab()
         view_tab = self.create_view_tab()
+        analytics_tab = self.create_analytics_tab()
 
         tab_widget.addTab(student_tab, "👥 Students")     
         tab_widget.addTab(groups_tab, "✨ Create Groups")  
         tab_widget.addTab(view_tab, "👀 View Groups")     
+        tab_widget.addTab(analytics_tab, "📊 Analytics")
 
         tab_widget.setTabToolTip(0, "Manage your student list")
         tab_widget.setTabToolTip(1, "Create new group combinations")
         tab_widget.setTabToolTip(2, "View generated groups")
+        tab_widget.setTabToolTip(3, "See how often students end up together")
         
         main_layout.addWidget(tab_widget)
             
@@ -274,7 +385,25 @@ class ModernGroupDividerApp(QMainWindow):
         header.setStyleSheet("font-size: 24px; font-weight: bold; margin-bottom: 16px;")
         layout.addWidget(header)
 
+        run_layout = QHBoxLayout()
+        run_label = QLabel("Run:")
+        self.run_selector = QComboBox()
+        self.run_selector.setStyleSheet(f"""
+            QComboBox {{
+                background-color: {COLORS['surface']};
+                border: 2px solid #e2e8f0;
+                border-radius: 6px;
+                padding: 6px;
+                font-size: 14px;
+            }}
+        """)
+        self.run_selector.currentIndexChanged.connect(self.select_run)
+        run_layout.addWidget(run_label)
+        run_layout.addWidget(self.run_selector, 1)
+        layout.addLayout(run_layout)
+
         self.combination_listbox = StyledListWidget()
+        self.combination_listbox.currentRowChanged.connect(self.show_combination)
         layout.addWidget(self.combination_listbox)
 
         button_layout = QHBoxLayout()
@@ -301,9 +430,59 @@ class ModernGroupDividerApp(QMainWindow):
             }}
         """)
         layout.addWidget(self.group_table)
+        self.empty_document = QTextDocument(self.group_table)
+
+        self.refresh_runs()
         
         return tab
     
+    def create_analytics_tab(self):
+        tab = QWidget()
+        layout = QVBoxLayout(tab)
+        layout.setSpacing(16)
+
+        header = QLabel("📊 Analytics")
+        header.setStyleSheet("font-size: 24px; font-weight: bold; margin-bottom: 16px;")
+        layout.addWidget(header)
+
+        button_layout = QHBoxLayout()
+        run_button = StyledButton("Analyze Selected Run", COLORS['primary'])
+        file_button = StyledButton("Analyze CSV File", COLORS['secondary'])
+        export_button = StyledButton("Export Results", COLORS['success'])
+
+        run_button.clicked.connect(self.analyze_selected_run)
+        file_button.clicked.connect(self.analyze_combinations_file)
+        export_button.clicked.connect(self.export_analysis)
+
+        button_layout.addWidget(run_button)
+        button_layout.addWidget(file_button)
+        button_layout.addWidget(export_button)
+        layout.addLayout(button_layout)
+
+        self.analysis_label = QLabel("Analyze a run to see how often each pair of students shares a group.")
+        self.analysis_label.setWordWrap(True)
+        self.analysis_label.setStyleSheet("""
+            padding: 16px;
+            background: #f1f5f9;
+            border-radius: 6px;
+            margin: 8px 0;
+        """)
+        layout.addWidget(self.analysis_label)
+
+        self.heatmap_table = QTableWidget()
+        self.heatmap_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.heatmap_table.setStyleSheet(f"""
+            QTableWidget {{
+                background-color: {COLORS['surface']};
+                border: 1px solid #e2e8f0;
+                border-radius: 6px;
+                font-size: 12px;
+            }}
+        """)
+        layout.addWidget(self.heatmap_table, 1)
+
+        return tab
+
     def show_message(self, title, text, icon=QMessageBox.Information):
         msg = QMessageBox(self)
         msg.setWindowTitle(title)
@@ -527,24 +706,38 @@ class ModernGroupDividerApp(QMainWindow):
                 }}
             """)
             
-            groups_list = []
-            for i in range(num_combinations):
-                shuffled_students = self.students.copy()
-                random.shuffle(shuffled_students)
-                groups = [shuffled_students[i::num_groups] for i in range(num_groups)]
-                groups_list.append(groups)
-                progress.setValue(i + 1)
-
+            seed = random.randrange(2**32)
+            rng = random.Random(seed)
             timestamp = time.strftime("%Y%m%d_%H%M%S")
             file_path = f"combinations_{timestamp}.csv"
             
             try:
+                positions = list(range(num_students))
+                groups_list = []
+                for i in range(num_combinations):
+                    rng.shuffle(positions)
+                    groups = [positions[i::num_groups] for i in range(num_groups)]
+                    groups_list.append(groups)
+                    progress.setValue(i + 1)
+
                 with open(file_path, mode='w', newline='', encoding='utf-8') as file:
                     writer = csv.writer(file)
-                    writer.writerows([[str(groups)] for groups in groups_list])
-                    
-                self.current_combination_file = file_path
-                self.show_combinations_from_file(file_path)
+                    writer.writerows(
+                        [[str([[self.students[p] for p in group] for group in groups])]
+                         for groups in groups_list]
+                    )
+
+                try:
+                    run_id = self.storage.add_run(
+                        self.students, num_groups, groups_list, seed,
+                        source_file=os.path.abspath(file_path)
+                    )
+                except Exception:
+                    # The run was rolled back, so don't leave its CSV behind either
+                    os.remove(file_path)
+                    raise
+
+                self.refresh_runs(select_run_id=run_id)
                 
                 self.show_message(
                     "Success",
@@ -577,9 +770,23 @@ class ModernGroupDividerApp(QMainWindow):
         if not file_path:
             return
             
+        file_path = os.path.abspath(file_path)
+        run_id = self.storage.find_run(file_path)
+        if run_id is not None:
+            self.refresh_runs(select_run_id=run_id)
+            self.show_message(
+                "Already Loaded",
+                f"Combinations from this file are already stored as run #{run_id}.",
+                QMessageBox.Information
+            )
+            return
+            
         try:
-            self.show_combinations_from_file(file_path)
-            self.current_combination_file = file_path
+            with open(file_path, mode='r', encoding='utf-8') as file:
+                reader = csv.reader(file)
+                rows = (ast.literal_eval(row[0]) for row in reader if row)
+                run_id = self.storage.import_combinations_csv(file_path, rows)
+            self.refresh_runs(select_run_id=run_id)
             
             self.show_message(
                 "Success",
@@ -587,30 +794,53 @@ class ModernGroupDividerApp(QMainWindow):
                 QMessageBox.Information
             )
             
+        except FileNotFoundError:
+            self.show_message(
+                "File Error",
+                f"File not found:\n{file_path}",
+                QMessageBox.Critical
+            )
         except Exception as e:
             self.show_message(
                 "Load Error",
                 f"Failed to load combinations file:\n{str(e)}",
                 QMessageBox.Critical
             )
+
+    def refresh_runs(self, select_run_id=None):
+        self.run_selector.blockSignals(True)
+        self.run_selector.clear()
+        for run_id, num_groups, num_combinations, seed, source_file, started_at, _, num_students in self.storage.list_runs():
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at))
+            label = f"#{run_id} · {started} · {num_students} students, {num_groups} groups, {num_combinations} combinations"
+            if source_file:
+                label += f" · {os.path.basename(source_file)}"
+            self.run_selector.addItem(label, run_id)
+        self.run_selector.blockSignals(False)
+
+        if select_run_id is not None:
+            index = self.run_selector.findData(select_run_id)
+        else:
+            index = 0 if self.run_selector.count() else -1
+        self.run_selector.setCurrentIndex(index)
+        self.select_run(index)
+
+    def select_run(self, index):
+        if index < 0:
+            self.current_run_id = None
+            self.combination_listbox.clear()
+            return
+        self.current_run_id = self.run_selector.itemData(index)
+        self.show_combinations_from_run(self.current_run_id)
             
-    def show_combinations_from_file(self, file_path):
+    def show_combinations_from_run(self, run_id):
         self.combination_listbox.clear()
+        self.clear_group_view()
         
         try:
-            with open(file_path, mode='r', encoding='utf-8') as file:
-                reader = csv.reader(file)
-                for i, row in enumerate(reader, 1):
-                    if row:  
-                        item_text = f"Combination {i}"
-                        self.combination_listbox.addItem(item_text)
+            count = self.storage.count_combinations(run_id)
+            self.combination_listbox.addItems([f"Combination {i}" for i in range(1, count + 1)])
                         
-        except FileNotFoundError:
-            self.show_message(
-                "File Error",
-                f"File not found:\n{file_path}",
-                QMessageBox.Critical
-            )
         except Exception as e:
             self.show_message(
                 "Load Error",
@@ -628,64 +858,249 @@ class ModernGroupDividerApp(QMainWindow):
             )
             return
             
-        if not self.current_combination_file:
+        if self.current_run_id is None:
             self.show_message(
                 "File Error",
-                "No combinations file loaded. Please load a file first.",
+                "No combinations loaded. Please generate or load combinations first.",
                 QMessageBox.Warning
             )
             return
             
         combination_index = self.combination_listbox.row(selected_items[0])
         
+        self.show_combination(combination_index)
+
+    def clear_group_view(self):
+        # Swap in the empty document rather than clearing the displayed one,
+        # which still lives in the cache and is reused when the run is revisited
+        self.prefetch_queue = []
+        self.group_table.setDocument(self.empty_document)
+        self.displayed_document = None
+
+    def show_combination(self, row):
+        if row < 0 or self.current_run_id is None:
+            return
+
         try:
-            with open(self.current_combination_file, mode='r', encoding='utf-8') as file:
-                reader = csv.reader(file)
-                groups = None
-                for i, row in enumerate(reader):
-                    if i == combination_index:
-                        groups = eval(row[0])
-                        break
-                        
-            if groups:
-                self.group_table.clear()
-                self.group_table.setHtml("""
-                    <style>
-                        .group-header {
-                            color: """ + COLORS['primary'] + """;
-                            font-size: 16px;
-                            font-weight: bold;
-                            margin: 12px 0 8px 0;
-                        }
-                        .student-item {
-                            margin: 4px 0;
-                            padding: 4px 0 4px 20px;
-                            color: """ + COLORS['text'] + """;
-                        }
-                    </style>
-                """)
-
-                for group_num, group in enumerate(groups, 1):
-                    self.group_table.append(f'<div class="group-header">Group {group_num}</div>')
-                    for student in group:
-                        self.group_table.append(
-                            f'<div class="student-item">• {student}</div>'
-                        )
-                    self.group_table.append("")
+            document = self.build_document(self.current_run_id, row)
+            if document:
+                self.group_table.setDocument(document)
+                self.displayed_document = document
+            self.schedule_prefetch(self.current_run_id, row)
                     
-        except FileNotFoundError:
-            self.show_message(
-                "File Error",
-                "Combinations file not found. Please load a file.",
-                QMessageBox.Critical
-            )
         except Exception as e:
             self.show_message(
                 "Error",
                 f"An error occurred while viewing groups:\n{str(e)}",
                 QMessageBox.Critical
             )
+
+    def build_document(self, run_id, row):
+        """Return the laid-out document for a combination, building it if needed.
+
+        Documents are laid out at the current viewport width, so showing a
+        cached one with setDocument skips the layout pass that setHtml does.
+        """
+        key = (run_id, row)
+        document = self.render_cache.get(key)
+        if document is None:
+            groups = self.storage.get_named_combination(run_id, row)
+            if not groups:
+                return None
+            document = QTextDocument()
+            document.setDefaultFont(self.group_table.font())
+            document.setTextWidth(self.group_table.viewport().width())
+            document.setHtml(render_groups_html(groups))
+            document.size()
+            self.render_cache.put(key, document)
+        return document
+
+    def schedule_prefetch(self, run_id, row):
+        count = self.combination_listbox.count()
+        self.prefetch_queue = [
+            (run_id, neighbour)
+            for distance in range(1, PREFETCH_DISTANCE + 1)
+            for neighbour in (row + distance, row - distance)
+            if 0 <= neighbour < count and (run_id, neighbour) not in self.render_cache
+        ]
+        if self.prefetch_queue:
+            self.prefetch_timer.start()
+
+    def prefetch_next(self):
+        # Builds one neighbouring document per idle tick on the GUI thread,
+        # since QTextDocument layout cannot be shared across threads
+        if not self.prefetch_queue:
+            return
+        run_id, row = self.prefetch_queue.pop(0)
+        try:
+            self.build_document(run_id, row)
+        except Exception:
+            self.prefetch_queue = []
+            return
+        if self.prefetch_queue:
+            self.prefetch_timer.start()
             
+    def analyze_selected_run(self):
+        if self.current_run_id is None:
+            self.show_message(
+                "Selection Error",
+                "Please select a run in the View Groups tab first.",
+                QMessageBox.Warning
+            )
+            return
+
+        self.analyze_run(self.current_run_id)
+
+    def analyze_run(self, run_id):
+        total = self.storage.get_run(run_id)[3]
+        worker = AnalysisWorker(run_id=run_id, database_path=self.storage.path, parent=self)
+        self.start_analysis(worker, total)
+
+    def analyze_combinations_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Analyze Combinations File",
+            "",
+            "CSV Files (*.csv);;All Files (*.*)"
+        )
+
+        if not file_path:
+            return
+
+        file_path = os.path.abspath(file_path)
+        run_id = self.storage.find_run(file_path)
+        if run_id is not None:
+            self.analyze_run(run_id)
+        else:
+            self.start_analysis(AnalysisWorker(file_path=file_path, parent=self), 0)
+
+    def start_analysis(self, worker, total):
+        if self.analysis_worker is not None and self.analysis_worker.isRunning():
+            self.show_message(
+                "Analytics Busy",
+                "An analysis is already running. Please wait for it to finish.",
+                QMessageBox.Warning
+            )
+            return
+
+        progress = QProgressDialog("Analyzing combinations...", "Cancel", 0, total, self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+
+        def report(count):
+            if total:
+                progress.setValue(count)
+            else:
+                progress.setLabelText(f"Analyzed {count:,} combinations...")
+
+        worker.progress.connect(report)
+        worker.done.connect(self.finish_analysis)
+        worker.failed.connect(self.fail_analysis)
+        worker.finished.connect(progress.close)
+        progress.canceled.connect(worker.requestInterruption)
+
+        self.analysis_worker = worker
+        worker.start()
+        progress.show()
+
+    def finish_analysis(self, result):
+        self.analysis_result = result
+        self.show_analysis(result)
+
+    def fail_analysis(self, message):
+        self.show_message(
+            "Analytics Error",
+            f"Failed to analyze combinations:\n{message}",
+            QMessageBox.Critical
+        )
+
+    def show_analysis(self, result):
+        summary = result.summary()
+        lines = [
+            f"<b>{summary['num_combinations']:,}</b> combinations of "
+            f"<b>{summary['num_students']}</b> students"
+        ]
+        if 'group_size_mean' in summary:
+            lines.append(
+                f"Group size: {summary['group_size_min']}–{summary['group_size_max']} "
+                f"(mean {summary['group_size_mean']:.2f}, std {summary['group_size_std']:.2f})"
+            )
+        if 'pair_rate_mean' in summary:
+            lines.append(
+                f"Pair together rate: mean {summary['pair_rate_mean']:.1%}, "
+                f"min {summary['pair_rate_min']:.1%}, max {summary['pair_rate_max']:.1%}"
+            )
+        if summary['most_together']:
+            first, second, count = summary['most_together'][0]
+            lines.append(
+                f"Most often together: {html.escape(first)} &amp; {html.escape(second)} ({count:,} times)"
+            )
+        if summary['always_together']:
+            lines.append(f"Pairs always together: {len(summary['always_together']):,}")
+        self.analysis_label.setText("<br>".join(lines))
+
+        names = result.names
+        rates = result.rates()
+        base = QColor(COLORS['primary'])
+        self.heatmap_table.setUpdatesEnabled(False)
+        self.heatmap_table.clear()
+        self.heatmap_table.setRowCount(len(names))
+        self.heatmap_table.setColumnCount(len(names))
+        self.heatmap_table.setHorizontalHeaderLabels(names)
+        self.heatmap_table.setVerticalHeaderLabels(names)
+        for i, row in enumerate(result.counts.tolist()):
+            for j, count in enumerate(row):
+                item = QTableWidgetItem(str(count))
+                if i != j:
+                    color = QColor(base)
+                    color.setAlphaF(float(rates[i, j]))
+                    item.setBackground(color)
+                item.setToolTip(f"{names[i]} & {names[j]}: {rates[i, j]:.1%}")
+                self.heatmap_table.setItem(i, j, item)
+        self.heatmap_table.setUpdatesEnabled(True)
+
+    def export_analysis(self):
+        if self.analysis_result is None:
+            self.show_message(
+                "Export Error",
+                "No analysis to export. Please analyze a run first.",
+                QMessageBox.Warning
+            )
+            return
+
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Export Co-occurrence Matrix",
+            "cooccurrence_matrix.csv",
+            "CSV Files (*.csv);;All Files (*.*)"
+        )
+
+        if not file_path:
+            return
+
+        try:
+            prefix = file_path[:-len("_matrix.csv")] if file_path.endswith("_matrix.csv") else os.path.splitext(file_path)[0]
+            matrix_path, summary_path = self.analysis_result.export(prefix)
+            self.show_message(
+                "Success",
+                f"Analysis exported to:\n{matrix_path}\n{summary_path}",
+                QMessageBox.Information
+            )
+        except Exception as e:
+            self.show_message(
+                "Export Error",
+                f"Failed to export analysis:\n{str(e)}",
+                QMessageBox.Critical
+            )
+
+    def closeEvent(self, event):
+        self.prefetch_timer.stop()
+        if self.analysis_worker is not None:
+            self.analysis_worker.requestInterruption()
+            self.analysis_worker.wait()
+        self.storage.close()
+        super().closeEvent(event)
+
     def adjust_color(self, hex_color, factor):
         """Utility method to adjust color brightness"""
         c = QColor(hex_color)
@@ -0,0 +1,256 @@
+import json
+import sqlite3
+import time
+from itertools import chain
+
+DATABASE_PATH = "group_divider.db"
+BATCH_SIZE = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rosters (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS roster_students (
+    roster_id INTEGER NOT NULL REFERENCES rosters(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (roster_id, position)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    roster_id INTEGER NOT NULL REFERENCES rosters(id) ON DELETE CASCADE,
+    num_groups INTEGER NOT NULL,
+    num_combinations INTEGER NOT NULL,
+    seed INTEGER,
+    source_file TEXT,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_roster_students_name ON roster_students(name, position);
+CREATE INDEX IF NOT EXISTS idx_runs_roster ON runs(roster_id);
+CREATE INDEX IF NOT EXISTS idx_runs_started ON runs(started_at);
+CREATE INDEX IF NOT EXISTS idx_runs_source ON runs(source_file);
+
+CREATE TABLE IF NOT EXISTS combinations (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    row_number INTEGER NOT NULL,
+    groups TEXT NOT NULL,
+    PRIMARY KEY (run_id, row_number)
+) WITHOUT ROWID;
+"""
+
+
+class GroupStorage:
+    """SQLite store for rosters, generation runs and their combinations.
+
+    Students are stored once per roster; each combination row keeps its
+    groups as a JSON list of lists of roster positions, so a run can be
+    browsed by (run_id, row_number) without touching any CSV file.
+    """
+
+    def __init__(self, path=DATABASE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _insert_roster(self, students, name):
+        cursor = self.conn.execute(
+            "INSERT INTO rosters (name, created_at) VALUES (?, ?)",
+            (name, time.time())
+        )
+        roster_id = cursor.lastrowid
+        self.conn.executemany(
+            "INSERT INTO roster_students (roster_id, position, name) VALUES (?, ?, ?)",
+            ((roster_id, position, student) for position, student in enumerate(students))
+        )
+        return roster_id
+
+    def find_roster(self, students):
+        """Return the id of a roster holding exactly these students in order, or None."""
+        if not students:
+            return None
+        candidates = self.conn.execute(
+            "SELECT roster_id FROM roster_students WHERE name = ? AND position = 0 ORDER BY roster_id DESC",
+            (students[0],)
+        ).fetchall()
+        for (roster_id,) in candidates:
+            if self.get_roster(roster_id) == list(students):
+                return roster_id
+        return None
+
+    def get_or_add_roster(self, students, name=""):
+        with self.conn:
+            return self._get_or_insert_roster(students, name)
+
+    def _get_or_insert_roster(self, students, name):
+        roster_id = self.find_roster(students)
+        if roster_id is None:
+            roster_id = self._insert_roster(students, name)
+        return roster_id
+
+    def get_roster(self, roster_id):
+        rows = self.conn.execute(
+            "SELECT name FROM roster_students WHERE roster_id = ? ORDER BY position",
+            (roster_id,)
+        )
+        return [row[0] for row in rows]
+
+    def _insert_run(self, roster_id, num_groups, num_combinations, seed, source_file):
+        cursor = self.conn.execute(
+            "INSERT INTO runs (roster_id, num_groups, num_combinations, seed, source_file, started_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (roster_id, num_groups, num_combinations, seed, source_file, time.time())
+        )
+        return cursor.lastrowid
+
+    def find_run(self, source_file):
+        """Return the id of the latest finished run stored from this file, or None."""
+        row = self.conn.execute(
+            "SELECT id FROM runs WHERE source_file = ? AND finished_at IS NOT NULL "
+            "ORDER BY started_at DESC LIMIT 1",
+            (source_file,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def add_run(self, students, num_groups, combinations, seed=None, source_file=None):
+        """Store generated combinations (lists of lists of roster positions) as a new run.
+
+        The roster, the run and every combination are written in a single
+        transaction, so a failure part way through leaves nothing behind.
+        Returns the id of the finished run.
+        """
+        with self.conn:
+            roster_id = self._get_or_insert_roster(students, source_file or "")
+            return self._store_run(roster_id, num_groups, combinations, seed, source_file)
+
+    def _store_run(self, roster_id, num_groups, combinations, seed, source_file):
+        run_id = self._insert_run(roster_id, num_groups, 0, seed, source_file)
+        count = 0
+        for batch in self._batches(run_id, combinations):
+            self._insert_batch(batch)
+            count += len(batch)
+        self.conn.execute(
+            "UPDATE runs SET num_combinations = ?, finished_at = ? WHERE id = ?",
+            (count, time.time(), run_id)
+        )
+        return run_id
+
+    def _batches(self, run_id, combinations):
+        batch = []
+        for row_number, groups in enumerate(combinations):
+            batch.append((run_id, row_number, json.dumps(groups, separators=(",", ":"))))
+            if len(batch) >= BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _insert_batch(self, batch):
+        self.conn.executemany(
+            "INSERT INTO combinations (run_id, row_number, groups) VALUES (?, ?, ?)",
+            batch
+        )
+
+    def import_combinations_csv(self, file_path, rows):
+        """Store combinations read from a legacy CSV file as a new run.
+
+        ``rows`` are lists of lists of student names. The roster is the
+        sorted students of the first row, and every later row must use
+        only those students. The import is a single transaction, so a bad
+        row leaves nothing behind; it raises ValueError describing the row.
+        """
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            raise ValueError("Combinations file is empty")
+        students = sorted(student for group in first for student in group)
+        for previous, student in zip(students, students[1:]):
+            if previous == student:
+                raise ValueError(f"Student {student!r} appears more than once in row 1")
+        positions = {student: position for position, student in enumerate(students)}
+
+        def encode(row_number, groups):
+            encoded = []
+            seen = set()
+            for group in groups:
+                if not group:
+                    raise ValueError(f"Row {row_number} has an empty group")
+                try:
+                    encoded_group = [positions[student] for student in group]
+                except KeyError as e:
+                    raise ValueError(
+                        f"Row {row_number} names unknown student {e.args[0]!r} "
+                        "(not in the first row)"
+                    ) from None
+                if seen.intersection(encoded_group) or len(set(encoded_group)) != len(encoded_group):
+                    raise ValueError(f"Row {row_number} lists a student more than once")
+                seen.update(encoded_group)
+                encoded.append(encoded_group)
+            return encoded
+
+        combinations = (encode(i, groups) for i, groups in enumerate(chain([first], rows), 1))
+        with self.conn:
+            roster_id = self._get_or_insert_roster(students, file_path)
+            return self._store_run(roster_id, len(first), combinations, None, file_path)
+
+    def list_runs(self):
+        return self.conn.execute(
+            "SELECT r.id, r.num_groups, r.num_combinations, r.seed, r.source_file, "
+            "r.started_at, r.finished_at, "
+            "(SELECT COUNT(*) FROM roster_students s WHERE s.roster_id = r.roster_id) "
+            "FROM runs r WHERE r.finished_at IS NOT NULL ORDER BY r.started_at DESC"
+        ).fetchall()
+
+    def get_run(self, run_id):
+        return self.conn.execute(
+            "SELECT id, roster_id, num_groups, num_combinations, seed, source_file, "
+            "started_at, finished_at FROM runs WHERE id = ?",
+            (run_id,)
+        ).fetchone()
+
+    def count_combinations(self, run_id):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM combinations WHERE run_id = ?",
+            (run_id,)
+        ).fetchone()[0]
+
+    def get_combination(self, run_id, row_number):
+        """Return one combination as lists of roster positions, or None."""
+        row = self.conn.execute(
+            "SELECT groups FROM combinations WHERE run_id = ? AND row_number = ?",
+            (run_id, row_number)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_named_combination(self, run_id, row_number):
+        """Return one combination with roster positions resolved to names."""
+        groups = self.get_combination(run_id, row_number)
+        if groups is None:
+            return None
+        run = self.get_run(run_id)
+        students = self.get_roster(run[1])
+        return [[students[position] for position in group] for group in groups]
+
+    def iter_raw_combinations(self, run_id, batch_size=BATCH_SIZE):
+        """Yield lists of undecoded JSON combination rows, one batch at a time."""
+        cursor = self.conn.execute(
+            "SELECT groups FROM combinations WHERE run_id = ? ORDER BY row_number",
+            (run_id,)
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [row[0] for row in rows]
@@ -0,0 +1,177 @@
+import ast
+import csv
+import json
+import random
+
+import numpy as np
+import pytest
+
+import analytics
+from storage import GroupStorage
+
+
+def make_combinations(num_students, num_groups, count, seed=0):
+    rng = random.Random(seed)
+    positions = list(range(num_students))
+    combinations = []
+    for _ in range(count):
+        rng.shuffle(positions)
+        combinations.append([positions[i::num_groups] for i in range(num_groups)])
+    return combinations
+
+
+def brute_force(num_students, combinations):
+    counts = np.zeros((num_students, num_students), dtype=np.int64)
+    for groups in combinations:
+        for group in groups:
+            for a in group:
+                for b in group:
+                    counts[a, b] += 1
+    return counts
+
+
+def write_csv(path, names, combinations):
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        for groups in combinations:
+            writer.writerow([str([[names[p] for p in group] for group in groups])])
+
+
+@pytest.mark.parametrize('num_students, num_groups', [
+    (200, 100), (200, 20), (200, 2), (10, 10), (7, 3), (50, 7),
+])
+@pytest.mark.parametrize('sparse_ratio', [0, 10 ** 9], ids=['bincount', 'matmul'])
+def test_accumulate_matches_brute_force(monkeypatch, num_students, num_groups, sparse_ratio):
+    monkeypatch.setattr(analytics, 'SPARSE_RATIO', sparse_ratio)
+    combinations = make_combinations(num_students, num_groups, 30)
+    names = [f"S{i}" for i in range(num_students)]
+
+    chunks = (analytics.chunk_arrays(combinations[i:i + 7]) for i in range(0, len(combinations), 7))
+    result = analytics.analyze(names, chunks)
+
+    assert result.num_combinations == 30
+    np.testing.assert_array_equal(result.counts, brute_force(num_students, combinations))
+
+
+def test_decode_json_chunk_matches_chunk_arrays():
+    combinations = make_combinations(50, 7, 20)
+    rows = [json.dumps(groups, separators=(",", ":")) for groups in combinations]
+
+    expected = analytics.chunk_arrays(combinations)
+    decoded = analytics.decode_json_chunk(rows)
+
+    assert decoded[0] == expected[0]
+    np.testing.assert_array_equal(decoded[1], expected[1])
+    np.testing.assert_array_equal(decoded[2], expected[2])
+
+
+@pytest.mark.parametrize('names', [
+    [f"Student {i}" for i in range(12)],
+    [f"O'Neil {i}" for i in range(12)],
+    [f"Siswa {i} Ñandú" for i in range(12)],
+], ids=['plain', 'literal-fallback', 'utf8'])
+def test_csv_source_matches_brute_force(tmp_path, names):
+    combinations = make_combinations(len(names), 3, 25)
+    path = tmp_path / 'combinations.csv'
+    write_csv(path, names, combinations)
+
+    roster, chunks = analytics.read_csv_source(str(path), chunk_size=4)
+    result = analytics.analyze(roster, chunks)
+
+    # The roster is sorted, so map brute-force positions onto it
+    order = [roster.index(name) for name in names]
+    expected = np.zeros_like(result.counts)
+    expected[np.ix_(order, order)] = brute_force(len(names), combinations)
+    assert roster == sorted(names)
+    assert result.num_combinations == 25
+    np.testing.assert_array_equal(result.counts, expected)
+
+
+def test_csv_source_and_stored_run_agree(tmp_path):
+    names = [f"Student {i}" for i in range(15)]
+    combinations = make_combinations(len(names), 4, 40)
+    path = tmp_path / 'combinations.csv'
+    write_csv(path, names, combinations)
+
+    roster, chunks = analytics.read_csv_source(str(path))
+    from_csv = analytics.analyze(roster, chunks)
+
+    storage = GroupStorage(str(tmp_path / 'test.db'))
+    try:
+        with open(path, encoding='utf-8') as file:
+            rows = (ast.literal_eval(row[0]) for row in csv.reader(file) if row)
+            run_id = storage.import_combinations_csv(str(path), rows)
+        run_names, run_chunks = analytics.read_run_source(storage, run_id)
+        from_run = analytics.analyze(run_names, run_chunks)
+    finally:
+        storage.close()
+
+    assert run_names == roster
+    np.testing.assert_array_equal(from_run.counts, from_csv.counts)
+
+
+def test_csv_source_rejects_unknown_student(tmp_path):
+    names = [f"Student {i}" for i in range(6)]
+    path = tmp_path / 'combinations.csv'
+    write_csv(path, names + ['Stranger'], [[[0, 1, 2], [3, 4, 5]], [[0, 1, 2], [3, 4, 6]]])
+
+    roster, chunks = analytics.read_csv_source(str(path))
+    with pytest.raises(ValueError, match="Stranger"):
+        analytics.analyze(roster, chunks)
+
+
+@pytest.mark.parametrize('names', [
+    ['Ana', 'Budi', 'Citra', 'Dewi'],
+    ["O'Neil", 'Budi', 'Citra', 'Dewi'],
+], ids=['fast', 'literal'])
+def test_csv_source_rejects_student_listed_twice(tmp_path, names):
+    path = tmp_path / 'combinations.csv'
+    write_csv(path, names, [[[0, 1], [2, 3]], [[1, 2], [3, 0]], [[0, 0], [2, 3]]])
+
+    roster, chunks = analytics.read_csv_source(str(path), chunk_size=2)
+    with pytest.raises(ValueError, match="Row 3 lists a student more than once"):
+        analytics.analyze(roster, chunks)
+
+
+@pytest.mark.parametrize('last_line', [
+    "\"[['Ana', 'Budi'], ['Cit",
+    "\"[['Ana', 'Budi'], ['Citra'",
+    "\"[['Ana', 'Budi'], ['Citra']",
+    "]'Ana']]",
+], ids=['mid-name', 'after-name', 'open-row', 'leading-bracket'])
+def test_csv_source_rejects_truncated_file(tmp_path, last_line):
+    path = tmp_path / 'combinations.csv'
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        file.write("\"[['Ana', 'Budi'], ['Citra']]\"\r\n" + last_line)
+
+    roster, chunks = analytics.read_csv_source(str(path))
+    with pytest.raises(ValueError, match="truncated/malformed"):
+        analytics.analyze(roster, chunks)
+
+
+def test_csv_source_rejects_duplicate_names(tmp_path):
+    path = tmp_path / 'combinations.csv'
+    write_csv(path, ['Ana', 'Budi', 'Ana'], [[[0, 1], [2]]])
+
+    with pytest.raises(ValueError, match="Ana"):
+        analytics.read_csv_source(str(path))
+
+
+def test_csv_source_rejects_empty_group(tmp_path):
+    path = tmp_path / 'combinations.csv'
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        csv.writer(file).writerows([["[['Ana', 'Budi'], ['Citra']]"], ["[['Ana', 'Budi', 'Citra'], []]"]])
+
+    roster, chunks = analytics.read_csv_source(str(path))
+    with pytest.raises(ValueError, match="empty group"):
+        analytics.analyze(roster, chunks)
+
+
+def test_literal_csv_source_rejects_empty_group(tmp_path):
+    path = tmp_path / 'combinations.csv'
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        csv.writer(file).writerows([["[[\"O'Neil\", 'Budi'], ['Citra']]"], ["[[\"O'Neil\", 'Budi', 'Citra'], []]"]])
+
+    roster, chunks = analytics.read_csv_source(str(path))
+    with pytest.raises(ValueError, match="empty group"):
+        analytics.analyze(roster, chunks)
@@ -0,0 +1,95 @@
+import pytest
+
+from storage import GroupStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = GroupStorage(str(tmp_path / 'test.db'))
+    yield storage
+    storage.close()
+
+
+def table_counts(storage):
+    return [
+        storage.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ('rosters', 'roster_students', 'runs', 'combinations')
+    ]
+
+
+@pytest.mark.parametrize('bad_row, message', [
+    ([['Ana', 'Budi'], ['Stranger']], "Row 3 names unknown student 'Stranger'"),
+    ([['Ana', 'Ana'], ['Citra']], "Row 3 lists a student more than once"),
+    ([['Ana', 'Budi', 'Citra'], []], "Row 3 has an empty group"),
+])
+def test_import_with_bad_row_leaves_nothing_behind(storage, bad_row, message):
+    rows = [[['Ana', 'Budi'], ['Citra']], [['Citra', 'Ana'], ['Budi']], bad_row]
+
+    with pytest.raises(ValueError, match=message):
+        storage.import_combinations_csv('combinations.csv', rows)
+
+    assert table_counts(storage) == [0, 0, 0, 0]
+    assert storage.list_runs() == []
+
+
+def test_add_run_failing_part_way_leaves_nothing_behind(storage):
+    def combinations():
+        yield [[0, 1], [2]]
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        storage.add_run(['Ana', 'Budi', 'Citra'], 2, combinations(), seed=1)
+
+    assert table_counts(storage) == [0, 0, 0, 0]
+
+
+def test_add_run_records_stored_count(storage):
+    run_id = storage.add_run(['Ana', 'Budi', 'Citra'], 2, [[[0, 1], [2]], [[2, 0], [1]]], seed=7,
+                             source_file='/tmp/combinations.csv')
+
+    run = storage.get_run(run_id)
+    assert run[2:6] == (2, 2, 7, '/tmp/combinations.csv')
+    assert run[7] is not None
+    assert storage.count_combinations(run_id) == 2
+    assert storage.find_run('/tmp/combinations.csv') == run_id
+
+
+def test_get_or_add_roster_reuses_identical_roster(storage):
+    roster_id = storage.get_or_add_roster(['Ana', 'Budi', 'Citra'])
+
+    assert storage.get_or_add_roster(['Ana', 'Budi', 'Citra']) == roster_id
+    assert storage.get_or_add_roster(['Ana', 'Citra', 'Budi']) != roster_id
+    assert storage.get_or_add_roster(['Ana', 'Budi']) != roster_id
+    assert storage.get_roster(roster_id) == ['Ana', 'Budi', 'Citra']
+
+
+def test_runs_share_identical_roster(storage):
+    first = storage.add_run(['Ana', 'Budi'], 1, [[[0, 1]]])
+    second = storage.import_combinations_csv('combinations.csv', [[['Budi', 'Ana']]])
+
+    assert storage.get_run(first)[1] == storage.get_run(second)[1]
+    assert storage.conn.execute("SELECT COUNT(*) FROM rosters").fetchone()[0] == 1
+
+
+def test_get_named_combination_round_trips_names(storage):
+    rows = [[['Ana', 'Budi'], ['Citra']], [['Citra', 'Ana'], ['Budi']]]
+    run_id = storage.import_combinations_csv('combinations.csv', rows)
+
+    assert storage.get_roster(storage.get_run(run_id)[1]) == ['Ana', 'Budi', 'Citra']
+    assert [storage.get_named_combination(run_id, row) for row in range(2)] == rows
+    assert storage.get_named_combination(run_id, 2) is None
+
+
+def test_unfinished_runs_are_ignored(storage):
+    run_id = storage.import_combinations_csv('combinations.csv', [[['Ana'], ['Budi']]])
+    # Simulate a run left behind by an older version that crashed mid-write
+    with storage.conn:
+        roster_id = storage.get_run(run_id)[1]
+        storage.conn.execute(
+            "INSERT INTO runs (roster_id, num_groups, num_combinations, source_file, started_at) "
+            "VALUES (?, 2, 10, 'combinations.csv', 1e12)",
+            (roster_id,)
+        )
+
+    assert storage.find_run('combinations.csv') == run_id
+    assert [run[0] for run in storage.list_runs()] == [run_id]